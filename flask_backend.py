@@ -3,6 +3,7 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formataddr
+from email import message_from_string
 import sqlite3
 import re
 from datetime import datetime
@@ -11,6 +12,8 @@ import os
 import logging
 from logging.handlers import RotatingFileHandler
 import sys
+import threading
+import time
 
 app = Flask(__name__)
 
@@ -69,6 +72,8 @@ if missing_vars:
 
 # ===== Database Setup =====
 DB_PATH = os.path.join(os.getcwd(), "data", "submissions.db")
+# Offline-queued submissions can be replayed days later, so keys are kept for a while
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 30 * 86400))
 
 def ensure_data_directory():
     """Ensure data directory exists"""
@@ -94,11 +99,57 @@ def init_db():
             submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # Monotonic data version shared by every worker process through the DB file
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_version (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO data_version (name, version) VALUES ('form_submissions', 0)
+    ''')
+    # Idempotency keys sent by the frontend so retried submissions are deduplicated
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS submission_idempotency (
+            idempotency_key TEXT PRIMARY KEY,
+            submission_id INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+    # Per-account SMTP send log used to enforce provider quotas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS smtp_send_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account TEXT NOT NULL,
+            sent_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_smtp_send_log_account ON smtp_send_log (account, sent_at)
+    ''')
+    # Outgoing email queue shared by all worker processes; survives restarts
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS email_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            enqueued_at REAL NOT NULL,
+            available_at REAL NOT NULL,
+            claimed_until REAL NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            deferred INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_email_queue_order ON email_queue (priority, enqueued_at)
+    ''')
     conn.commit()
     conn.close()
     app.logger.info("Database initialized successfully")
 
-def save_submission(form_data):
+def save_submission(form_data, idempotency_key=None):
     try:
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
@@ -116,15 +167,93 @@ def save_submission(form_data):
             form_data.get('budget_timeline'),
             form_data.get('additional_info')
         ))
-        conn.commit()
         submission_id = cursor.lastrowid
+        if idempotency_key:
+            cursor.execute('''
+                DELETE FROM submission_idempotency WHERE created_at < ?
+            ''', (time.time() - IDEMPOTENCY_KEY_TTL,))
+            # Raises IntegrityError (rolling back the insert) if a concurrent retry won the race
+            cursor.execute('''
+                INSERT INTO submission_idempotency (idempotency_key, submission_id, created_at)
+                VALUES (?, ?, ?)
+            ''', (idempotency_key, submission_id, time.time()))
+        # Bump the data version in the same transaction so cached reads are invalidated
+        cursor.execute('''
+            UPDATE data_version SET version = version + 1 WHERE name = 'form_submissions'
+        ''')
+        conn.commit()
         conn.close()
         app.logger.info(f"Form submission saved with ID: {submission_id}")
         return submission_id
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        conn.close()
+        raise
     except Exception as e:
         app.logger.error(f"Database error in save_submission: {e}")
         raise
 
+def find_submission_by_idempotency_key(idempotency_key):
+    """Return the submission ID already stored for an idempotency key, if any"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        row = conn.execute(
+            "SELECT submission_id FROM submission_idempotency WHERE idempotency_key = ? AND created_at >= ?",
+            (idempotency_key, time.time() - IDEMPOTENCY_KEY_TTL)
+        ).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+def get_data_version():
+    """Return the current form_submissions data version"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        row = conn.execute(
+            "SELECT version FROM data_version WHERE name = 'form_submissions'"
+        ).fetchone()
+        return row[0] if row else 0
+    finally:
+        conn.close()
+
+# ===== Submissions Read Cache =====
+# /api/submissions returns the whole table; with Persian text JSON-escaped a row
+# serializes to roughly 2-4 KB, so 64 MiB holds well over ten thousand submissions
+CACHE_CONFIG = {
+    'max_bytes': int(os.getenv('SUBMISSIONS_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+}
+
+class SubmissionsCache:
+    """Single slot holding the serialized submissions list, tagged with the data version"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def get(self, version):
+        with self._lock:
+            if self._entry is None:
+                return None
+            entry_version, body = self._entry
+            if entry_version != version:
+                # Stale entry: a submission was saved since it was cached
+                self._entry = None
+                return None
+            return body
+
+    def put(self, version, body):
+        if len(body) > self.max_bytes:
+            app.logger.warning(
+                f"Submissions cache: {len(body)} byte result exceeds max_bytes={self.max_bytes}, "
+                f"not cached; raise SUBMISSIONS_CACHE_MAX_BYTES"
+            )
+            return
+        with self._lock:
+            self._entry = (version, body)
+
+submissions_cache = SubmissionsCache(CACHE_CONFIG['max_bytes'])
+
 def validate_email(email):
     """Validate email format with proper regex"""
     if not email or not isinstance(email, str):
@@ -174,10 +303,356 @@ def normalize_phone_number(phone):
     clean_phone = re.sub(r'[^\d]', '', phone)
     return clean_phone
 
+# ===== SMTP Send Scheduling =====
+# Lower value is sent first when quotas are tight
+PRIORITY_CONFIRMATION = 0
+PRIORITY_INTERNAL = 1
+
+SMTP_SCHEDULER_CONFIG = {
+    'timeout': int(os.getenv('SMTP_TIMEOUT', 30)),
+    'max_attempts': int(os.getenv('SMTP_MAX_ATTEMPTS', 8)),
+    'retry_delay': int(os.getenv('SMTP_RETRY_DELAY', 30)),
+    'max_retry_delay': int(os.getenv('SMTP_MAX_RETRY_DELAY', 3600)),
+    # How often an idle worker checks the shared queue for jobs enqueued by other processes
+    'poll_interval': int(os.getenv('SMTP_QUEUE_POLL_INTERVAL', 15)),
+    # Wait before retrying when the queue or send log database is locked
+    'busy_delay': 1
+}
+# A claimed job is handed to another worker if its claimant dies mid-send
+SMTP_SCHEDULER_CONFIG['claim_timeout'] = SMTP_SCHEDULER_CONFIG['timeout'] * 4 + 60
+
+def load_smtp_accounts():
+    """Build the SMTP account list: EMAIL_CONFIG first, then EMAIL_2/EMAIL_PASSWORD_2/... relays.
+
+    Quotas come from SMTP_RATE_PER_SECOND/_MINUTE/_DAY (with the same numeric
+    suffix for relays); 0 disables a limit.
+    """
+    accounts = []
+    index = 1
+    while True:
+        suffix = '' if index == 1 else f'_{index}'
+        email = os.getenv(f'EMAIL{suffix}')
+        password = os.getenv(f'EMAIL_PASSWORD{suffix}')
+        if not email or not password:
+            break
+
+        smtp_server = os.getenv(f'SMTP_SERVER{suffix}', EMAIL_CONFIG['smtp_server'])
+        accounts.append({
+            'name': f"{email}@{smtp_server}",
+            'smtp_server': smtp_server,
+            'smtp_port': int(os.getenv(f'SMTP_PORT{suffix}', EMAIL_CONFIG['smtp_port'])),
+            'email': email,
+            'password': password,
+            'per_second': int(os.getenv(f'SMTP_RATE_PER_SECOND{suffix}', 0)),
+            'per_minute': int(os.getenv(f'SMTP_RATE_PER_MINUTE{suffix}', 20)),
+            'per_day': int(os.getenv(f'SMTP_RATE_PER_DAY{suffix}', 500))
+        })
+        index += 1
+    return accounts
+
+def reserve_send_slot(account):
+    """Claim a send slot for the account.
+
+    Returns 0 when the slot was reserved, otherwise the number of seconds until
+    the account's quotas allow another message. The send log lives in the
+    SQLite database so quotas hold across worker processes.
+    """
+    now = time.time()
+    conn = sqlite3.connect(DB_PATH, timeout=10, isolation_level=None)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        wait = 0.0
+        for window, limit in ((1, account['per_second']),
+                              (60, account['per_minute']),
+                              (86400, account['per_day'])):
+            if limit <= 0:
+                continue
+            count, oldest = conn.execute(
+                'SELECT COUNT(*), MIN(sent_at) FROM smtp_send_log WHERE account = ? AND sent_at > ?',
+                (account['name'], now - window)
+            ).fetchone()
+            if count >= limit:
+                wait = max(wait, oldest + window - now)
+
+        if wait > 0:
+            conn.execute('ROLLBACK')
+            return wait
+
+        conn.execute('DELETE FROM smtp_send_log WHERE account = ? AND sent_at <= ?',
+                     (account['name'], now - 86400))
+        conn.execute('INSERT INTO smtp_send_log (account, sent_at) VALUES (?, ?)',
+                     (account['name'], now))
+        conn.execute('COMMIT')
+        return 0
+    finally:
+        conn.close()
+
+def deliver_message(account, msg):
+    """Send a prepared message through one SMTP account"""
+    del msg['From']
+    msg['From'] = formataddr((EMAIL_CONFIG['from_name'], account['email']))
+
+    server = smtplib.SMTP(account['smtp_server'], account['smtp_port'],
+                          timeout=SMTP_SCHEDULER_CONFIG['timeout'])
+    try:
+        server.starttls()
+        server.login(account['email'], account['password'])
+        server.send_message(msg)
+    finally:
+        try:
+            server.quit()
+        except smtplib.SMTPException:
+            server.close()
+
+def is_permanent_smtp_error(error):
+    """True only when every recipient was refused with a 5xx reply; no retry or other account will fix that.
+
+    Everything else, including 5xx sender refusals and DATA replies (providers
+    report quota exhaustion as e.g. '550 5.4.6'), is treated as a problem with
+    the account and triggers cooldown and failover instead.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return False
+
+class EmailScheduler:
+    """Background sender that enforces per-account quotas.
+
+    Messages are stored in the email_queue table, so deferred mail survives
+    restarts and any worker process can send it. Jobs are deferred, never
+    dropped, while every account is over quota. A failing account is put on
+    cooldown and the next one is tried; if all fail the message is retried
+    with backoff. Messages the server rejects permanently are not retried.
+    """
+
+    def __init__(self, accounts, config):
+        self.accounts = accounts
+        self.config = config
+        self._cooldown = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stats = {
+            'sent': 0,
+            'failed': 0,
+            'rejected': 0,
+            'deferrals': 0,
+            'retried': 0,
+            'failovers': 0,
+            'wait_total': {},
+            'wait_max': {},
+            'wait_count': {}
+        }
+
+    def enqueue(self, msg, priority, kind):
+        now = time.time()
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        try:
+            conn.execute('''
+                INSERT INTO email_queue (kind, priority, message, enqueued_at, available_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (kind, priority, msg.as_string(), now, now))
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.ensure_worker()
+        with self._condition:
+            self._condition.notify()
+        app.logger.info(f"Queued {kind} email")
+        return True
+
+    def stats(self):
+        now = time.time()
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        try:
+            queued, waiting_retry, deferred = conn.execute('''
+                SELECT COUNT(*),
+                       COALESCE(SUM(available_at > ?), 0),
+                       COALESCE(SUM(deferred), 0)
+                FROM email_queue
+            ''', (now,)).fetchone()
+        finally:
+            conn.close()
+
+        with self._condition:
+            wait_times = {}
+            for kind, count in self._stats['wait_count'].items():
+                wait_times[kind] = {
+                    'count': count,
+                    'avg_seconds': round(self._stats['wait_total'][kind] / count, 3),
+                    'max_seconds': round(self._stats['wait_max'][kind], 3)
+                }
+            # Queue counts (including 'deferred', jobs still waiting on quotas) are shared by
+            # all workers; the rest, like the cumulative 'deferrals', cover this process only
+            return {
+                'queued': queued - waiting_retry,
+                'waiting_retry': waiting_retry,
+                'deferred': deferred,
+                'deferrals': self._stats['deferrals'],
+                'sent': self._stats['sent'],
+                'failed': self._stats['failed'],
+                'rejected': self._stats['rejected'],
+                'retried': self._stats['retried'],
+                'failovers': self._stats['failovers'],
+                'queue_wait': wait_times
+            }
+
+    def ensure_worker(self):
+        # Started lazily so forked worker processes each get their own thread
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='email-scheduler', daemon=True)
+                self._thread.start()
+
+    def _claim_job(self):
+        """Atomically claim the most urgent available job, or return (None, seconds until one is due)"""
+        now = time.time()
+        conn = sqlite3.connect(DB_PATH, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('''
+                SELECT * FROM email_queue
+                WHERE available_at <= ? AND claimed_until < ?
+                ORDER BY priority, enqueued_at, id
+                LIMIT 1
+            ''', (now, now)).fetchone()
+            if row is None:
+                next_due = conn.execute(
+                    'SELECT MIN(MAX(available_at, claimed_until)) FROM email_queue'
+                ).fetchone()[0]
+                conn.execute('ROLLBACK')
+                if next_due is None:
+                    return None, self.config['poll_interval']
+                return None, min(max(next_due - now, 0), self.config['poll_interval'])
+
+            conn.execute('UPDATE email_queue SET claimed_until = ? WHERE id = ?',
+                         (now + self.config['claim_timeout'], row['id']))
+            conn.execute('COMMIT')
+            return dict(row), 0
+        finally:
+            conn.close()
+
+    def _update_job(self, job, sql, params=()):
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        try:
+            conn.execute(sql, params + (job['id'],))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _run(self):
+        while True:
+            try:
+                job, wait = self._claim_job()
+                if job is not None:
+                    wait = self._dispatch(job)
+            except Exception as e:
+                # Never let the worker die; a claimed job is picked up again once its claim expires
+                app.logger.error(f"Email scheduler error: {e}")
+                wait = self.config['busy_delay']
+
+            if wait > 0:
+                with self._condition:
+                    self._condition.wait(timeout=wait)
+
+    def _dispatch(self, job):
+        """Try to send one job; return seconds to pause when every account is busy"""
+        wait = None
+        failed_accounts = 0
+        msg = message_from_string(job['message'])
+
+        for account in self.accounts:
+            now = time.time()
+            cooldown_until = self._cooldown.get(account['name'], 0)
+            if cooldown_until > now:
+                wait = cooldown_until - now if wait is None else min(wait, cooldown_until - now)
+                continue
+
+            try:
+                slot_wait = reserve_send_slot(account)
+            except sqlite3.Error as e:
+                # e.g. 'database is locked' while another worker holds the send log
+                app.logger.warning(f"Could not reserve SMTP slot for {account['name']}: {e}")
+                slot_wait = self.config['busy_delay']
+            if slot_wait > 0:
+                wait = slot_wait if wait is None else min(wait, slot_wait)
+                continue
+
+            try:
+                deliver_message(account, msg)
+            except Exception as e:
+                if is_permanent_smtp_error(e):
+                    self._reject(job, e)
+                    return 0
+                failed_accounts += 1
+                self._cooldown[account['name']] = time.time() + self.config['retry_delay']
+                app.logger.warning(f"SMTP account {account['name']} failed to send {job['kind']} email: {e}")
+                continue
+
+            self._record_sent(job, failed_accounts)
+            app.logger.info(f"{job['kind'].capitalize()} email sent via {account['name']}")
+            return 0
+
+        if failed_accounts:
+            self._retry_later(job)
+            return 0
+
+        # Every account is over quota or cooling down: release the job so it keeps its place
+        self._update_job(job, 'UPDATE email_queue SET claimed_until = 0, deferred = 1 WHERE id = ?')
+        if not job['deferred']:
+            with self._condition:
+                self._stats['deferrals'] += 1
+            app.logger.warning(f"{job['kind'].capitalize()} email deferred for {wait:.1f}s by SMTP quotas")
+        return wait
+
+    def _reject(self, job, error):
+        self._update_job(job, 'DELETE FROM email_queue WHERE id = ?')
+        with self._condition:
+            self._stats['rejected'] += 1
+        app.logger.error(f"{job['kind'].capitalize()} email rejected permanently, not retrying: {error}")
+
+    def _retry_later(self, job):
+        attempts = job['attempts'] + 1
+        if attempts >= self.config['max_attempts']:
+            self._update_job(job, 'DELETE FROM email_queue WHERE id = ?')
+            with self._condition:
+                self._stats['failed'] += 1
+            app.logger.error(f"Giving up on {job['kind']} email after {attempts} attempts")
+            return
+
+        delay = min(self.config['retry_delay'] * 2 ** (attempts - 1),
+                    self.config['max_retry_delay'])
+        self._update_job(job, '''
+            UPDATE email_queue SET attempts = ?, available_at = ?, claimed_until = 0 WHERE id = ?
+        ''', (attempts, time.time() + delay))
+        with self._condition:
+            self._stats['retried'] += 1
+        app.logger.warning(f"{job['kind'].capitalize()} email will be retried in {delay}s")
+
+    def _record_sent(self, job, failed_accounts):
+        self._update_job(job, 'DELETE FROM email_queue WHERE id = ?')
+        waited = time.time() - job['enqueued_at']
+        kind = job['kind']
+        with self._condition:
+            self._stats['sent'] += 1
+            if failed_accounts:
+                self._stats['failovers'] += 1
+            self._stats['wait_total'][kind] = self._stats['wait_total'].get(kind, 0) + waited
+            self._stats['wait_max'][kind] = max(self._stats['wait_max'].get(kind, 0), waited)
+            self._stats['wait_count'][kind] = self._stats['wait_count'].get(kind, 0) + 1
+
+email_scheduler = EmailScheduler(load_smtp_accounts(), SMTP_SCHEDULER_CONFIG)
+
+# Forked worker processes don't inherit the scheduler thread; start it on first request
+@app.before_request
+def start_email_scheduler():
+    email_scheduler.ensure_worker()
+
 # ===== Email Sending Functions =====
 def send_confirmation_email(form_data):
     try:
-        app.logger.info(f"Sending confirmation email to: {form_data['email']}")
+        app.logger.info(f"Queueing confirmation email to: {form_data['email']}")
         
         msg = MIMEMultipart()
         msg['From'] = formataddr((EMAIL_CONFIG['from_name'], EMAIL_CONFIG['email']))
@@ -384,13 +859,7 @@ def send_confirmation_email(form_data):
         """
 
         msg.attach(MIMEText(html_body, 'html', 'utf-8'))
-        server = smtplib.SMTP(EMAIL_CONFIG['smtp_server'], EMAIL_CONFIG['smtp_port'])
-        server.starttls()
-        server.login(EMAIL_CONFIG['email'], EMAIL_CONFIG['password'])
-        server.send_message(msg)
-        app.logger.info("Confirmation email sent successfully")
-        server.quit()
-        return True
+        return email_scheduler.enqueue(msg, PRIORITY_CONFIRMATION, 'confirmation')
     except Exception as e:
         app.logger.error(f"Email sending error: {e}")
         return False
@@ -475,21 +944,37 @@ def send_internal_notification(form_data, submission_id):
         """
 
         msg.attach(MIMEText(html_body, 'html', 'utf-8'))
-        server = smtplib.SMTP(EMAIL_CONFIG['smtp_server'], EMAIL_CONFIG['smtp_port'])
-        server.starttls()
-        server.login(EMAIL_CONFIG['email'], EMAIL_CONFIG['password'])
-        server.send_message(msg)
-        app.logger.info("Internal notification sent successfully")
-        server.quit()
-        return True
+        return email_scheduler.enqueue(msg, PRIORITY_INTERNAL, 'internal notification')
     except Exception as e:
         app.logger.error(f"Internal notification error: {e}")
         return False
 
 # ===== API Routes =====
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,128}$')
+
+def duplicate_submission_response(submission_id):
+    """Response for a retried submission that was already saved; emails are not resent"""
+    return jsonify({
+        "success": True,
+        "message": "فرم شما با موفقیت ثبت شد و به زودی تیم ما با شما تماس خواهد گرفت",
+        "submission_id": submission_id,
+        "duplicate": True
+    }), 200
+
 @app.route("/submit-form", methods=["POST"])
 def submit_form():
     try:
+        # Retries from the frontend reuse the key of the original form fill
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip() or None
+        if idempotency_key:
+            if not IDEMPOTENCY_KEY_PATTERN.match(idempotency_key):
+                return jsonify({"error": "کلید یکتای درخواست معتبر نیست"}), 400
+
+            existing_id = find_submission_by_idempotency_key(idempotency_key)
+            if existing_id is not None:
+                app.logger.info(f"Duplicate submission for ID {existing_id} ignored")
+                return duplicate_submission_response(existing_id)
+
         data = request.get_json()
 
         # Handle multiple or single service_type
@@ -555,7 +1040,15 @@ def submit_form():
             }), 400
 
         # Save submission to database
-        submission_id = save_submission(data)
+        try:
+            submission_id = save_submission(data, idempotency_key)
+        except sqlite3.IntegrityError:
+            # A concurrent retry with the same key was saved first
+            existing_id = idempotency_key and find_submission_by_idempotency_key(idempotency_key)
+            if not existing_id:
+                raise
+            app.logger.info(f"Duplicate submission for ID {existing_id} ignored")
+            return duplicate_submission_response(existing_id)
         app.logger.info(f"Form saved with ID: {submission_id}")
 
         # Send confirmation email to user
@@ -572,10 +1065,10 @@ def submit_form():
         
         if not email_sent:
             response_data["warning"] = "فرم ثبت شد اما ایمیل تایید ارسال نشد"
-            app.logger.warning("Confirmation email failed to send")
+            app.logger.warning("Confirmation email failed to queue")
             
         if not notification_sent:
-            app.logger.warning("Internal notification failed to send")
+            app.logger.warning("Internal notification failed to queue")
 
         return jsonify(response_data), 200
 
@@ -628,7 +1121,7 @@ def test_email():
     success = send_confirmation_email(test_data)
     
     if success:
-        return jsonify({"message": "ایمیل تست با موفقیت ارسال شد"}), 200
+        return jsonify({"message": "ایمیل تست در صف ارسال قرار گرفت"}), 200
     else:
         return jsonify({"error": "خطا در ارسال ایمیل تست"}), 500
 
@@ -648,37 +1141,62 @@ def get_submissions():
         if not expected_token or auth_token != f"Bearer {expected_token}":
             return jsonify({'error': 'غیرمجاز'}), 401
         
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, name, email, phone_number, instagram_link, service_type, 
-                   project_description, budget_timeline, additional_info, submission_date
-            FROM form_submissions 
-            ORDER BY submission_date DESC
-        ''')
-        
-        submissions = []
-        for row in cursor.fetchall():
-            submissions.append({
-                'id': row[0],
-                'name': row[1],
-                'email': row[2],
-                'phone_number': row[3],
-                'instagram_link': row[4],
-                'service_type': row[5],
-                'project_description': row[6],
-                'budget_timeline': row[7],
-                'additional_info': row[8],
-                'submission_date': row[9]
-            })
-        
-        conn.close()
-        return jsonify(submissions), 200
+        # The query takes no parameters, so every request (including cache-busting
+        # query strings from pollers) shares the single cached body.
+        # Read the version before querying so a concurrent save can only make the entry stale
+        data_version = get_data_version()
+        body = submissions_cache.get(data_version)
+        cache_status = 'HIT'
+
+        if body is None:
+            cache_status = 'MISS'
+            conn = sqlite3.connect(DB_PATH)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, name, email, phone_number, instagram_link, service_type, 
+                       project_description, budget_timeline, additional_info, submission_date
+                FROM form_submissions 
+                ORDER BY submission_date DESC
+            ''')
+            
+            submissions = []
+            for row in cursor.fetchall():
+                submissions.append({
+                    'id': row[0],
+                    'name': row[1],
+                    'email': row[2],
+                    'phone_number': row[3],
+                    'instagram_link': row[4],
+                    'service_type': row[5],
+                    'project_description': row[6],
+                    'budget_timeline': row[7],
+                    'additional_info': row[8],
+                    'submission_date': row[9]
+                })
+            
+            conn.close()
+            body = f"{app.json.dumps(submissions)}\n".encode('utf-8')
+            submissions_cache.put(data_version, body)
+
+        response = app.response_class(body, mimetype=app.json.mimetype)
+        response.headers['X-Cache'] = cache_status
+        return response, 200
         
     except Exception as e:
         app.logger.error(f"Error fetching submissions: {e}")
         return jsonify({'error': 'خطا در دریافت اطلاعات'}), 500
 
+# ===== Email scheduler stats (admin route with basic auth) =====
+@app.route("/api/email-stats", methods=["GET"])
+def get_email_stats():
+    auth_token = request.headers.get('Authorization')
+    expected_token = os.getenv('ADMIN_TOKEN')
+
+    if not expected_token or auth_token != f"Bearer {expected_token}":
+        return jsonify({'error': 'غیرمجاز'}), 401
+
+    return jsonify(email_scheduler.stats()), 200
+
 # ===== Error handlers =====
 @app.errorhandler(404)
 def not_found(error):
@@ -693,11 +1211,13 @@ def internal_error(error):
 def create_app():
     """Application factory"""
     init_db()
+    email_scheduler.ensure_worker()
     return app
 
 if __name__ == "__main__":
     # Initialize database
     init_db()
+    email_scheduler.ensure_worker()
     
     # Get configuration from environment
     port = int(os.getenv('PORT'))